@@ -1,143 +1,225 @@
 import argparse
+import os
+
+# The policy is a tiny MLP, so OpenMP/MKL worker threads cost far more to synchronize than they save.
+# These must be set before torch is imported.
+os.environ.setdefault('OMP_NUM_THREADS', '1')
+os.environ.setdefault('MKL_NUM_THREADS', '1')
+
 import gymnasium as gym
 from stable_baselines3 import DDPG, TD3
 from stable_baselines3.common.noise import NormalActionNoise
-from stable_baselines3.common.vec_env import DummyVecEnv
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
 import numpy as np
 from stable_baselines3.common.utils import set_random_seed
 import torch
 from stable_baselines3.td3.policies import TD3Policy
 import matplotlib.pyplot as plt
+from myCartpoleF_SwingUp import VectorCartPoleSwingUp
 
-# Setting up the argument parser for command-line inputs
-parser = argparse.ArgumentParser()
 
-# Device to run the code on (CPU or GPU)
-parser.add_argument('--device', type=str, default='cpu', help='Specify device: cpu or cuda')
+def main():
+    # Setting up the argument parser for command-line inputs
+    parser = argparse.ArgumentParser()
 
-# Whether to load a pre-trained model
-parser.add_argument('--load', type=str, default='True', help='Load a pre-trained model (True/False)', choices=['True', 'False'])
+    # Device to run the code on (CPU or GPU)
+    parser.add_argument('--device', type=str, default='cpu', help='Specify device: cpu or cuda')
 
+    # Whether to load a pre-trained model
+    parser.add_argument('--load', action=argparse.BooleanOptionalAction, default=True, help='Load a pre-trained model (--load/--no-load)')
 
-# Path to save the trained model
-parser.add_argument('--save', default=True, help='Save the model or not')
 
-# Number of episodes for evaluation
-parser.add_argument('--eval_episodes', type=int, default=10, help='Number of episodes for evaluation')
+    # Path to save the trained model
+    parser.add_argument('--save', action=argparse.BooleanOptionalAction, default=True, help='Save the model or not (--save/--no-save)')
 
-# Total timesteps to train the model
-parser.add_argument('--train_timesteps', type=int, default=None, help='Number of timesteps for training (set to None to skip training)')
+    # Number of episodes for evaluation
+    parser.add_argument('--eval_episodes', type=int, default=10, help='Number of episodes for evaluation')
 
-# Maximum steps allowed per episode
-parser.add_argument('--max_episode_step', type=int, default=None, help='Maximum steps allowed per episode.')
+    # Total timesteps to train the model
+    parser.add_argument('--train_timesteps', type=int, default=None, help='Number of timesteps for training (set to None to skip training)')
 
-parser.add_argument('--seed', type=int, default=3, help='Random seed to guarantee reproducibility')
-#seed 3
-# Parse the input arguments
-args = parser.parse_args()
+    # Maximum steps allowed per episode
+    parser.add_argument('--max_episode_step', type=int, default=None, help='Maximum steps allowed per episode.')
 
-# Extract parsed arguments for convenience
-device = args.device
+    parser.add_argument('--seed', type=int, default=3, help='Random seed to guarantee reproducibility')
 
-load = args.load
-train_timesteps = args.train_timesteps
-eval_episodes = args.eval_episodes
-max_episode_step = args.max_episode_step
-save = args.save
-seed = args.seed
+    # Whether to render the environment in a window (headless evaluation is much faster)
+    parser.add_argument('--render', action=argparse.BooleanOptionalAction, default=False, help='Render the environment (--render/--no-render)')
 
-set_random_seed(seed)
+    # Only draw every N-th evaluation step when rendering
+    parser.add_argument('--render_every', type=int, default=1, help='Render every N-th step during evaluation')
 
-# Register the custom CartPoleSwingUp environment with Gym
-gym.register(
-    id='CartPoleSwingUp',
-    entry_point='myCartpoleF_SwingUp:CartPoleSwingUp',  # Custom environment location
-    reward_threshold=0,  # Reward threshold for environment completion
-    max_episode_steps=max_episode_step  # Maximum steps per episode
-)
+    # Number of environments collecting training rollouts in parallel subprocesses
+    parser.add_argument('--num_envs', type=int, default=1, help='Number of training environments (more than 1 steps them in subprocesses)')
+    #seed 3
+    # Parse the input arguments
+    args = parser.parse_args()
+    if args.render_every < 1:
+        parser.error(f'--render_every must be at least 1, got {args.render_every}')
 
-# Create a vectorized environment with rendering enabled
-env = DummyVecEnv([lambda: gym.make('CartPoleSwingUp', render_mode='human')])
+    # Extract parsed arguments for convenience
+    device = args.device
 
-# Load or initialize the TD3 model
-
-if load == 'True':
-    print("Loading the pre-trained model...")
-    model = TD3.load(path='model/td3_smaller_force/td3_swingup_balance', env=env)
-    model.load_replay_buffer("model/td3_smaller_force/td3_swingup_balance_replay_buffer")
-else:
-    # Add noise to actions for exploration during training
-    action_noise = NormalActionNoise(
-        mean=np.zeros(env.action_space.shape),
-        sigma=0.1 * np.ones(env.action_space.shape)
-    )
+    load = args.load
+    train_timesteps = args.train_timesteps
+    eval_episodes = args.eval_episodes
+    max_episode_step = args.max_episode_step
+    save = args.save
+    seed = args.seed
+    render = args.render
+    render_every = args.render_every
+    num_envs = args.num_envs
 
-    # Initialize a new TD3 model with a custom neural network architecture
+    set_random_seed(seed)
+    torch.set_num_threads(1)
+    torch.set_num_interop_threads(1)
 
-    # Create the TD3 model with the custom policy
-    model = TD3(
-        TD3Policy,
-        env,
-        policy_kwargs=dict(net_arch=[256, 256, 32]),
-        action_noise=action_noise
+    # Register the custom CartPoleSwingUp environment with Gym
+    gym.register(
+        id='CartPoleSwingUp',
+        entry_point='myCartpoleF_SwingUp:CartPoleSwingUp',  # Custom environment location
+        reward_threshold=0,  # Reward threshold for environment completion
+        max_episode_steps=max_episode_step  # Maximum steps per episode
     )
 
-# Train the model if the user specifies a training duration
-if train_timesteps is not None:
-    print('--------------Training the Model--------------')
-    model.learn(total_timesteps=train_timesteps)
-
-# Evaluate the model
-
-if eval_episodes is not None:
-    print('--------------Evaluating the Model--------------')
-    for episode in range(eval_episodes):
-        # Reset the environment at the start of each episode
-        obs = env.reset()
-        done = False
-        # Accumulate rewards for this episode
-        total_reward = 0
+    train = train_timesteps is not None
+    if not load and not train:
+        print('Nothing to evaluate: either load the pre-trained model or train a new one (--train_timesteps)')
+        return
+
+    # The SB3 environment is only needed for training; evaluation builds its own vectorized env
+    env = None
+    if train:
+        # Pass the spec itself to gym.make, since subprocesses do not run the registration above
+        spec = gym.spec('CartPoleSwingUp')
+        if num_envs > 1:
+            # Step the environments in parallel subprocesses so rollouts overlap with the gradient updates
+            env = SubprocVecEnv([lambda: gym.make(spec) for _ in range(num_envs)])
+        else:
+            # Create a vectorized environment, rendering only when requested.
+            # The env renders itself on every step in 'human' mode, so no explicit env.render() is needed.
+            env = DummyVecEnv([lambda: gym.make(spec, render_mode='human' if render else None)])
+
+    # Load or initialize the TD3 model
+
+    if load:
+        print("Loading the pre-trained model...")
+        model = TD3.load(path='model/td3_smaller_force/td3_swingup_balance', env=env, device=device)
+        # The replay buffer (tens of MB) is only needed to continue training,
+        # and the saved one stores transitions from a single environment
+        if train and num_envs == 1:
+            model.load_replay_buffer("model/td3_smaller_force/td3_swingup_balance_replay_buffer")
+    else:
+        # Add noise to actions for exploration during training
+        action_noise = NormalActionNoise(
+            mean=np.zeros(env.action_space.shape),
+            sigma=0.1 * np.ones(env.action_space.shape)
+        )
+
+        # Initialize a new TD3 model with a custom neural network architecture
+
+        # Create the TD3 model with the custom policy
+        model = TD3(
+            TD3Policy,
+            env,
+            policy_kwargs=dict(net_arch=[256, 256, 32]),
+            action_noise=action_noise,
+            device=device
+        )
+
+    # Train the model if the user specifies a training duration
+    if train:
+        print('--------------Training the Model--------------')
+        model.learn(total_timesteps=train_timesteps)
+
+    # Evaluate the model
+
+    if eval_episodes:
+        print('--------------Evaluating the Model--------------')
+        # Run the evaluation episodes side by side in one NumPy-vectorized env, so that one predict()
+        # call serves the whole batch and the physics of all episodes is advanced with array operations.
+        # Episodes are capped at 1000 steps. Only the first sub-environment is rendered.
+        eval_env = VectorCartPoleSwingUp(
+            num_envs=eval_episodes,
+            max_episode_steps=1000 if max_episode_step is None else min(max_episode_step, 1000),
+            render_mode='human' if render else None,
+            render_every=render_every
+        )
+        obs, _ = eval_env.reset(seed=seed)
+        # Trace the actor once and call it directly instead of going through SB3's predict() wrapper
+        # on every step. TD3's predict() adds no exploration noise, so the actions are the same.
+        with torch.no_grad():
+            traced_actor = torch.jit.trace(model.policy.actor.eval(), torch.as_tensor(obs, device=model.device))
+        # Reuse one observation tensor and one action array for every step
+        obs_t = torch.empty(eval_env.observation_space.shape, device=model.device)
+        action = np.empty(eval_env.action_space.shape, dtype=np.float32)
+        # Each sub-environment runs one evaluation episode. Finished sub-environments are reset by the
+        # env itself on their next step and keep running until all are done, so only the first episode
+        # of every sub-environment is counted (short episodes would otherwise be over-represented).
+        episode_reward = np.zeros(eval_env.num_envs, dtype=np.float64)
+        finished = np.zeros(eval_env.num_envs, dtype=bool)
+        # (end step, total reward) of the first episode of every sub-environment
+        episodes = [None] * eval_env.num_envs
         force_list = []
         cos_list = []
         x_dot_list = []
         theta_dot_list = []
         i = 0
-        while not done and i < 1000:
+        while not finished.all():
+            # Predict the actions of all sub-environments at once
+            obs_t.copy_(torch.from_numpy(obs))
+            # inference_mode skips autograd bookkeeping entirely, unlike no_grad
+            with torch.inference_mode():
+                action[:] = traced_actor(obs_t).cpu().numpy()
+            force_list.append(10 * action[:, 0])
+            # Take the actions and observe the results
+            obs, reward, terminated, truncated, info = eval_env.step(action)
+            cos_list.append(obs[:, 2])
+            x_dot_list.append(obs[:, 1])
+            theta_dot_list.append(obs[:, 4])
+            episode_reward += reward
+            done = np.logical_or(terminated, truncated) & ~finished
+            for j in np.flatnonzero(done):
+                episodes[j] = (i + 1, float(episode_reward[j]))
+            finished |= done
             i += 1
-            # Predict the action
-            action, _ = model.predict(obs, deterministic=False)
-            force_list.append(10 * action[0])
-            # Take the action and observe the result
-            obs, reward, done, info = env.step(action)
-            cos_list.append(obs[0][2])
-            x_dot_list.append(obs[0][1])
-            theta_dot_list.append(obs[0][4])
-            # Add the reward to the total
-            total_reward += reward
-            # Render the environment
-            env.render()
-        print(f'Episode: {episode + 1} | Total Reward: {total_reward}')
-        fig, axes = plt.subplots(4, 1, figsize=(8, 12))  # 4 rows, 1 column
-
-        axes[0].plot(cos_list)
-        axes[0].set_ylabel('Cosine theta')
-
-        axes[1].plot(x_dot_list)
-        axes[1].set_ylabel('x_dot')
-
-        axes[2].plot(theta_dot_list)
-        axes[2].set_ylabel('theta_dot')
-
-        axes[3].plot(force_list)
-        axes[3].set_ylabel('force')
-
-        plt.tight_layout()  # Adjusts layout to prevent overlapping labels
-        plt.show()
-# Save the trained model if a save path is specified
-if save:
-    print(f"Saving the model")
-    model.save('model/td3_smaller_force/td3_swingup_balance')
-    model.save_replay_buffer("model/td3_smaller_force/td3_swingup_balance_replay_buffer")
-
-# Close the environment
-env.close()
+        eval_env.close()
+
+        # Report all episodes with a single write instead of one print per episode
+        print('\n'.join(f'Episode: {episode + 1} | Total Reward: {total_reward}'
+                        for episode, (_, total_reward) in enumerate(episodes)))
+
+        force_list = np.stack(force_list)
+        cos_list = np.stack(cos_list)
+        x_dot_list = np.stack(x_dot_list)
+        theta_dot_list = np.stack(theta_dot_list)
+        for j, (end, _) in enumerate(episodes):
+            fig, axes = plt.subplots(4, 1, figsize=(8, 12))  # 4 rows, 1 column
+
+            axes[0].plot(cos_list[:end, j])
+            axes[0].set_ylabel('Cosine theta')
+
+            axes[1].plot(x_dot_list[:end, j])
+            axes[1].set_ylabel('x_dot')
+
+            axes[2].plot(theta_dot_list[:end, j])
+            axes[2].set_ylabel('theta_dot')
+
+            axes[3].plot(force_list[:end, j])
+            axes[3].set_ylabel('force')
+
+            plt.tight_layout()  # Adjusts layout to prevent overlapping labels
+            plt.show()
+    # Save the trained model if a save path is specified (an untouched pre-trained model is not re-saved)
+    if save and train:
+        print(f"Saving the model")
+        model.save('model/td3_smaller_force/td3_swingup_balance')
+        model.save_replay_buffer("model/td3_smaller_force/td3_swingup_balance_replay_buffer")
+
+    # Close the environment
+    if env is not None:
+        env.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,7 @@ permalink: https://perma.cc/C9ZM-652R
 """
 import math
 import torch
-from typing import Optional, Tuple, Union
+from typing import Optional, Sequence, Tuple, Union
 
 import numpy as np
 
@@ -13,10 +13,177 @@ import gymnasium as gym
 from gymnasium import logger, spaces
 from gymnasium.envs.classic_control import utils
 from gymnasium.error import DependencyNotInstalled
-from gymnasium.vector import VectorEnv
+from gymnasium.vector import AutoresetMode, VectorEnv
 from gymnasium.vector.utils import batch_space
 
 
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:
+    # numba is optional; without it VectorCartPoleSwingUp steps with NumPy array arithmetic
+    HAVE_NUMBA = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+
+# reset distribution of (x, x_dot, theta, theta_dot): pole hanging down, cart near the centre;
+# rows with low == high come out exactly, so one uniform call draws the whole state
+_RESET_LOW = np.array([-0.05, 0.0, -0.001 - math.pi, 0.0])
+_RESET_HIGH = np.array([0.05, 0.0, 0.001 - math.pi, 0.0])
+_RESET_SPAN = _RESET_HIGH - _RESET_LOW
+
+
+def _swingup_coeffs(env):
+    """
+    Constant coefficients of the swing-up (DC-motor) model, computed once from the physical
+    parameters of env so that _swingup_accel only has to do the state-dependent arithmetic.
+    """
+    r_mp2 = env.r_mp**2
+    motor_damping = env.Rm * r_mp2 * env.Beq + env.Kg**2 * env.Kt * env.Km
+    inertia = env.masscart * r_mp2 + env.masspole * r_mp2 + env.Jm * env.Kg**2
+
+    # denominator = d0 + c_denom_sin * sin(theta)**2, shared by both accelerations
+    d0 = 4 * env.masscart * r_mp2 + env.masspole * r_mp2 + 4 * env.Jm * env.Kg**2
+    c_denom_sin = 3 * r_mp2 * env.masspole
+
+    # xacc * denominator = c_xdot_x * x_dot + c_tdot_x * cos * theta_dot + c_tdot2_x * sin * theta_dot**2
+    #                      + c_grav_x * cos * sin + c_force_x * force
+    c_xdot_x = -4 * motor_damping / env.Rm
+    c_tdot_x = -3 * env.Bp * r_mp2 / env.length
+    c_tdot2_x = -4 * env.masspole * env.length * r_mp2
+    c_grav_x = 3 * env.masspole * env.gravity * r_mp2
+    c_force_x = 4 * env.r_mp * env.Kg * env.Kt / env.Rm
+
+    # thetaacc * denominator = c_xdot_theta * cos * x_dot + c_tdot_theta * theta_dot
+    #                          + c_tdot2_theta * sin * cos * theta_dot**2 + c_grav_theta * sin
+    #                          + c_force_theta * cos * force
+    c_xdot_theta = -3 * motor_damping / (env.length * env.Rm)
+    c_tdot_theta = -3 * inertia * env.Bp / (env.masspole * env.length**2)
+    c_tdot2_theta = -3 * env.masspole * r_mp2
+    c_grav_theta = 3 * inertia * env.gravity / env.length
+    c_force_theta = 3 * env.r_mp * env.Kg * env.Kt / (env.length * env.Rm)
+
+    return (d0, c_denom_sin,
+            c_xdot_x, c_tdot_x, c_tdot2_x, c_grav_x, c_force_x,
+            c_xdot_theta, c_tdot_theta, c_tdot2_theta, c_grav_theta, c_force_theta)
+
+
+def _rhs_core(x_dot, theta_dot, sintheta, costheta, inv_denom, force, coeffs):
+    """
+    Cart and pole accelerations of the swing-up (DC-motor) model, given sin/cos of the pole angle
+    and the reciprocal of their common denominator, d0 + c_denom_sin * sin(theta)**2.
+
+    Only elementwise arithmetic is used, so the same function works on floats (CartPoleSwingUp)
+    and on arrays of all sub-environments (VectorCartPoleSwingUp), and compiles for _rk4_batch.
+    coeffs is the tuple returned by _swingup_coeffs.
+    """
+    (d0, c_denom_sin,
+     c_xdot_x, c_tdot_x, c_tdot2_x, c_grav_x, c_force_x,
+     c_xdot_theta, c_tdot_theta, c_tdot2_theta, c_grav_theta, c_force_theta) = coeffs
+
+    theta_dot2 = theta_dot**2
+    sincos = sintheta * costheta
+
+    xacc = (c_xdot_x * x_dot + c_tdot_x * costheta * theta_dot + c_tdot2_x * sintheta * theta_dot2
+            + c_grav_x * sincos + c_force_x * force) * inv_denom
+
+    thetaacc = (c_xdot_theta * costheta * x_dot + c_tdot_theta * theta_dot
+                + c_tdot2_theta * sincos * theta_dot2 + c_grav_theta * sintheta
+                + c_force_theta * costheta * force) * inv_denom
+
+    return xacc, thetaacc
+
+
+def _swingup_accel(x_dot, sintheta, costheta, theta_dot, force, coeffs):
+    # accelerations from sin/cos of the pole angle; the denominator is shared by both rows
+    inv_denom = 1.0 / (coeffs[0] + coeffs[1] * sintheta**2)
+    return _rhs_core(x_dot, theta_dot, sintheta, costheta, inv_denom, force, coeffs)
+
+
+def _rhs(x, x_dot, theta, theta_dot, force, coeffs):
+    # time derivative of the state, as a tuple so that no array is allocated;
+    # one sin, one cos and one reciprocal
+    s = math.sin(theta)
+    c = math.cos(theta)
+    inv_denom = 1.0 / (coeffs[0] + coeffs[1] * s * s)
+    xacc, thetaacc = _rhs_core(x_dot, theta_dot, s, c, inv_denom, force, coeffs)
+    return x_dot, xacc, theta_dot, thetaacc
+
+
+def _rk4(x, x_dot, theta, theta_dot, force, coeffs, tau):
+    """
+    One step of the "RK4" integrator as the checkpoint in model/ was trained with it, from
+    (x, x_dot, theta, theta_dot). Returns the new state as a tuple.
+
+    The original RHS(y, force) ignored y and evaluated every stage at the current state, so
+    k1 == k2 == k3 == k4 and y + tau/6 * (k1 + 2*k2 + 2*k3 + k4) is the explicit Euler step
+    y + tau * k1 computed here. Evaluating the stages at their intermediate states is a change
+    of dynamics (and of the evaluation scores), which needs a retrained checkpoint to go with it.
+    """
+    _, xacc, _, thetaacc = _rhs(x, x_dot, theta, theta_dot, force, coeffs)
+    return (x + tau * x_dot,
+            x_dot + tau * xacc,
+            theta + tau * theta_dot,
+            theta_dot + tau * thetaacc)
+
+
+# compiled copy of _rhs_core for the batch kernel; the scalar env calls the plain-Python function,
+# which is faster there than a numba dispatch with a tuple of 12 floats per call
+_rhs_core_jit = njit(cache=True)(_rhs_core)
+
+
+@njit(cache=True, parallel=True)
+def _rk4_batch(state, force, coeffs, tau):
+    """
+    In-place "RK4" step (the Euler-equivalent update of _rk4) of every column of a
+    (4, num_envs) state, spread over threads with prange.
+    Only worth calling when numba is installed (see HAVE_NUMBA); otherwise this is a Python loop.
+    """
+    for j in prange(state.shape[1]):
+        x, x_dot, theta, theta_dot = state[0, j], state[1, j], state[2, j], state[3, j]
+        s = math.sin(theta)
+        c = math.cos(theta)
+        inv_denom = 1.0 / (coeffs[0] + coeffs[1] * s * s)
+        xacc, thetaacc = _rhs_core_jit(x_dot, theta_dot, s, c, inv_denom, force[j], coeffs)
+        state[0, j] = x + tau * x_dot
+        state[1, j] = x_dot + tau * xacc
+        state[2, j] = theta + tau * theta_dot
+        state[3, j] = theta_dot + tau * thetaacc
+
+
+def _fused_rk4(cupy):
+    """
+    "RK4" step (see _rk4) of the swing-up model compiled by cupy.fuse into a single elementwise
+    CUDA kernel (one launch per env step instead of one per NumPy-style op), for
+    VectorCartPoleSwingUp with backend="cupy". Built on demand so that cupy stays an optional
+    dependency.
+
+    The kernel takes the four state rows, the force, tau and the _swingup_coeffs entries as
+    separate arguments (fuse does not accept tuples) and returns the new state rows.
+    """
+    @cupy.fuse()
+    def rk4(x, x_dot, theta, theta_dot, force, tau,
+            d0, c_denom_sin, c_xdot_x, c_tdot_x, c_tdot2_x, c_grav_x, c_force_x,
+            c_xdot_theta, c_tdot_theta, c_tdot2_theta, c_grav_theta, c_force_theta):
+        coeffs = (d0, c_denom_sin, c_xdot_x, c_tdot_x, c_tdot2_x, c_grav_x, c_force_x,
+                  c_xdot_theta, c_tdot_theta, c_tdot2_theta, c_grav_theta, c_force_theta)
+        s = cupy.sin(theta)
+        c = cupy.cos(theta)
+        inv_denom = 1 / (d0 + c_denom_sin * s * s)
+        xacc, thetaacc = _rhs_core(x_dot, theta_dot, s, c, inv_denom, force, coeffs)
+        return (x + tau * x_dot,
+                x_dot + tau * xacc,
+                theta + tau * theta_dot,
+                theta_dot + tau * thetaacc)
+
+    return rk4
+
+
 class CartPoleSwingUp(gym.Env[np.ndarray, Union[int, np.ndarray]]):
 
     """
@@ -84,6 +251,7 @@ class CartPoleSwingUp(gym.Env[np.ndarray, Union[int, np.ndarray]]):
         # both of these are in N.m.s/RAD, not degrees
         self.Beq = 5.4 #  equivalent viscous damping coecient as seen at the motor pinion
         self.Bp = 0.0024 # viscous damping doecient, as seen at the pendulum axis
+        self._coeffs = _swingup_coeffs(self)
 
         self.force_mag = 10.0 # should be 8 for our case?
         self.tau = 1/self.fps  # seconds between state updates
@@ -94,6 +262,12 @@ class CartPoleSwingUp(gym.Env[np.ndarray, Union[int, np.ndarray]]):
 
         # self.kinematics_integrator = "semi-implicit-euler" # newly added from native CartPole
         self.kinematics_integrator = "RK4"
+        # resolved once here instead of comparing strings on every step
+        self._integrate = {
+            "euler": self._euler_step,
+            "semi-euler": self._semi_euler_step,
+            "RK4": self._rk4_step,
+        }[self.kinematics_integrator]
 
         # copied the following from mountain_car
 
@@ -144,14 +318,43 @@ class CartPoleSwingUp(gym.Env[np.ndarray, Union[int, np.ndarray]]):
 
         self.screen_width = 600
         self.screen_height = 400
+        # render geometry, fixed by the constants above
+        self._scale = self.screen_width / (self.x_threshold * 2)
+        self._polewidth = 10.0
+        self._polelen = self._scale * (2 * self.length)
+        cartwidth = 50.0
+        cartheight = 30.0
+        # y in screen coordinates (row 0 at the top), mirrored the way pygame.transform.flip used to
+        # mirror the finished frame, so that frames are drawn straight onto the screen
+        self._carty = self.screen_height - 1 - 100  # TOP OF CART
+        self._axley = self._carty - cartheight / 4.0
+        # integer centre row and radius of the axle circle (the row the flipped frame used to have)
+        self._axle_row = self.screen_height - 1 - int(100 + cartheight / 4.0)
+        self._axle_radius = int(self._polewidth / 2)
+        # the cart is axis aligned: a cartwidth x cartheight rect centred on (cartx, carty)
+        self._cart_halfwidth = cartwidth / 2
+        self._cart_top = self._carty - cartheight / 2
+        self._cart_size = (cartwidth, cartheight)
+        l, r, t, b = (
+            -self._polewidth / 2,
+            self._polewidth / 2,
+            self._polelen - self._polewidth / 2,
+            -self._polewidth / 2,
+        )
+        self._pole_local = ((l, b), (l, t), (r, t), (r, b))
         self.screen = None
         self.clock = None
         self.isopen = True
+        self._blank = None  # white background with the ground line, blitted over the screen each frame
+        self._drawn_state = None  # state of the frame on self.screen, to skip redrawing it
         self.state = None
 
         self.steps_beyond_terminated = None
 
         self.previous_force = 0
+
+        # state buffer reused by every step/reset instead of allocating new arrays
+        self._state = np.empty(4, dtype=np.float32)
         # seems to be outdated
         """
         self.seed()
@@ -171,129 +374,55 @@ class CartPoleSwingUp(gym.Env[np.ndarray, Union[int, np.ndarray]]):
         (array([0.6823519 , 0.05382102, 0.22035988, 0.18437181], dtype=float32), {})
         """
 
-    def RHS(self, y, force):
-
-        assert self.state is not None, "Call reset before using step method."
-        # x, theta, x_dot, theta_dot = self.state
-        # to be consistent with native CartPole state = x, x_dot, theta, theta_dot
+    def _euler_step(self, force):
         x, x_dot, theta, theta_dot = self.state
+        xacc, thetaacc = _swingup_accel(x_dot, math.sin(theta), math.cos(theta), theta_dot, force, self._coeffs)
+        return (x + self.tau * x_dot,
+                x_dot + self.tau * xacc,
+                theta + self.tau * theta_dot,
+                theta_dot + self.tau * thetaacc)
 
-        costheta = math.cos(theta)
-        sintheta = math.sin(theta)
-
-        # denominator used in a bunch of stuff
-        d = 4 * self.masscart * self.r_mp**2 + self.masspole * self.r_mp**2 + 4 * self.Jm * self.Kg**2
-        y = self.state
-
-        xacc = ((-4 * (self.Rm * self.r_mp**2 * self.Beq + self.Kg**2 * self.Kt * self.Km)) / (self.Rm *(d + 3 * self.r_mp**2 * self.masspole * sintheta**2))) * x_dot + ((-3 * self.Bp * self.r_mp**2 * costheta) / (self.length * (d + 3 * self.r_mp**2 * self.masspole * sintheta**2))) * theta_dot + ((-4 * self.masspole * self.length * self.r_mp**2 * sintheta) / (d + 3 * self.r_mp**2 * self.masspole * sintheta**2)) * theta_dot**2 + ((3 * self.masspole * self.gravity * self.r_mp**2 * costheta * sintheta) / (d + 3 * self.r_mp**2 * self.masspole * sintheta**2)) + (4 * self.r_mp * self.Kg * self.Kt) / (self.Rm * (d + 3 * self.r_mp**2 * self.masspole * sintheta**2)) * force
-
-        thetaacc = ((-3 * (self.Rm * self.r_mp**2 * self.Beq + self.Kg**2 * self.Kt * self.Km) * costheta) / (self.length * self.Rm * (d + 3 * self.r_mp**2 * self.masspole * sintheta**2))) * x_dot + ((-3 * (self.masscart * self.r_mp**2 + self.masspole * self.r_mp**2 + self.Jm * self.Kg**2) * self.Bp) / (self.masspole * self.length**2 * (d + 3 * self.r_mp**2 * self.masspole * sintheta**2))) * theta_dot + ((-3 * self.masspole * self.r_mp**2 * sintheta * costheta) / (d + 3 * self.r_mp**2 * self.masspole * sintheta**2)) * theta_dot**2 + ((3 * (self.masscart * self.r_mp**2 + self.masspole * self.r_mp**2 + self.Jm * self.Kg**2) * self.gravity * sintheta) / (self.length * (d + 3 * self.r_mp**2 * self.masspole * sintheta**2))) + (3 * self.r_mp * self.Kg * self.Kt * costheta) / (self.length * self.Rm * (d + 3 * self.r_mp**2 * self.masspole * sintheta**2)) * force
-
-        return np.array( (x_dot, xacc, theta_dot, thetaacc), dtype=np.float32).flatten()
-
-
-    def stepPhysics(self, force):
-        # assert self.action_space.contains(
-        #     action
-        # ), f"{action!r} ({type(action)}) invalid"
-
-        assert self.state is not None, "Call reset before using step method."
-        # x, theta, x_dot, theta_dot = self.state
-        # to be consistent with native CartPole state = x, x_dot, theta, theta_dot
+    def _semi_euler_step(self, force):
         x, x_dot, theta, theta_dot = self.state
+        xacc, thetaacc = _swingup_accel(x_dot, math.sin(theta), math.cos(theta), theta_dot, force, self._coeffs)
+        x_dot = x_dot + self.tau * xacc
+        theta_dot = theta_dot + self.tau * thetaacc
+        return x + self.tau * x_dot, x_dot, theta + self.tau * theta_dot, theta_dot
 
-        costheta = math.cos(theta)
-        sintheta = math.sin(theta)
-
-        # denominator used in a bunch of stuff
-        d = 4 * self.masscart * self.r_mp**2 + self.masspole * self.r_mp**2 + 4 * self.Jm * self.Kg**2
-
-
-        xacc = ((-4 * (self.Rm * self.r_mp**2 * self.Beq + self.Kg**2 * self.Kt * self.Km)) / (self.Rm *(d + 3 * self.r_mp**2 * self.masspole * sintheta**2))) * x_dot + ((-3 * self.Bp * self.r_mp**2 * costheta) / (self.length * (d + 3 * self.r_mp**2 * self.masspole * sintheta**2))) * theta_dot + ((-4 * self.masspole * self.length * self.r_mp**2 * sintheta) / (d + 3 * self.r_mp**2 * self.masspole * sintheta**2)) * theta_dot**2 + ((3 * self.masspole * self.gravity * self.r_mp**2 * costheta * sintheta) / (d + 3 * self.r_mp**2 * self.masspole * sintheta**2)) + (4 * self.r_mp * self.Kg * self.Kt) / (self.Rm * (d + 3 * self.r_mp**2 * self.masspole * sintheta**2)) * force
-
-        thetaacc = ((-3 * (self.Rm * self.r_mp**2 * self.Beq + self.Kg**2 * self.Kt * self.Km) * costheta) / (self.length * self.Rm * (d + 3 * self.r_mp**2 * self.masspole * sintheta**2))) * x_dot + ((-3 * (self.masscart * self.r_mp**2 + self.masspole * self.r_mp**2 + self.Jm * self.Kg**2) * self.Bp) / (self.masspole * self.length**2 * (d + 3 * self.r_mp**2 * self.masspole * sintheta**2))) * theta_dot + ((-3 * self.masspole * self.r_mp**2 * sintheta * costheta) / (d + 3 * self.r_mp**2 * self.masspole * sintheta**2)) * theta_dot**2 + ((3 * (self.masscart * self.r_mp**2 + self.masspole * self.r_mp**2 + self.Jm * self.Kg**2) * self.gravity * sintheta) / (self.length * (d + 3 * self.r_mp**2 * self.masspole * sintheta**2))) + (3 * self.r_mp * self.Kg * self.Kt * costheta) / (self.length * self.Rm * (d + 3 * self.r_mp**2 * self.masspole * sintheta**2)) * force
-
-        if self.kinematics_integrator == "euler":
-            x = x + self.tau * x_dot
-            x_dot = x_dot + self.tau * xacc
-            theta = theta + self.tau * theta_dot
-            theta_dot = theta_dot + self.tau * thetaacc
-        if self.kinematics_integrator == "semi-euler":
-            x_dot = x_dot + self.tau * xacc
-            x = x + self.tau * x_dot
-            theta_dot = theta_dot + self.tau * thetaacc
-            theta = theta + self.tau * theta_dot
-
-        if self.kinematics_integrator == "RK4":
-            # RK4
-            y = self.state
-            k1 = self.RHS(y, force = force)
-            k2 = self.RHS(y + self.tau * k1 / 2, force = force)
-            k3 = self.RHS(y + self.tau * k2 / 2, force = force)
-            k4 = self.RHS(y + self.tau * k3, force = force)
-            y = y + self.tau/6 * (k1 + 2 * k2 + 2 * k3 + k4)
-            x, x_dot, theta, theta_dot = y
-
-        # self.state = (x, x_dot, theta, theta_dot)
-        return np.array( (x, x_dot,theta, theta_dot), dtype = np.float32).flatten()
+    def _rk4_step(self, force):
+        x, x_dot, theta, theta_dot = self.state
+        return _rk4(x, x_dot, theta, theta_dot, force, self._coeffs, self.tau)
 
     def stepSwingUp(self, force):
         # assert self.action_space.contains(
         #     0.1 * force
         # ), f"{force!r} ({type(force)}) invalid"
-        # Currently same as stepPhysics
-        # Need to modify??
 
         assert self.state is not None, "Call reset before using step method."
         # x, theta, x_dot, theta_dot = self.state
         # to be consistent with native CartPole state = x, x_dot, theta, theta_dot
-        x, x_dot, theta, theta_dot = self.state
-
-        costheta = math.cos(theta)
-        sintheta = math.sin(theta)
         # theta = math.atan(sintheta/costheta) # nikki_: this isn't corrent, atan maps to -pi/2 to pi/2 but our angle can be -pi to pi
-        # denominator used in a bunch of stuff
-        d = 4 * self.masscart * self.r_mp**2 + self.masspole * self.r_mp**2 + 4 * self.Jm * self.Kg**2
-
-
-        xacc = ((-4 * (self.Rm * self.r_mp**2 * self.Beq + self.Kg**2 * self.Kt * self.Km)) / (self.Rm *(d + 3 * self.r_mp**2 * self.masspole * sintheta**2))) * x_dot + ((-3 * self.Bp * self.r_mp**2 * costheta) / (self.length * (d + 3 * self.r_mp**2 * self.masspole * sintheta**2))) * theta_dot + ((-4 * self.masspole * self.length * self.r_mp**2 * sintheta) / (d + 3 * self.r_mp**2 * self.masspole * sintheta**2)) * theta_dot**2 + ((3 * self.masspole * self.gravity * self.r_mp**2 * costheta * sintheta) / (d + 3 * self.r_mp**2 * self.masspole * sintheta**2)) + (4 * self.r_mp * self.Kg * self.Kt) / (self.Rm * (d + 3 * self.r_mp**2 * self.masspole * sintheta**2)) * force
+        x, x_dot, theta, theta_dot = self._integrate(force)
 
-        thetaacc = ((-3 * (self.Rm * self.r_mp**2 * self.Beq + self.Kg**2 * self.Kt * self.Km) * costheta) / (self.length * self.Rm * (d + 3 * self.r_mp**2 * self.masspole * sintheta**2))) * x_dot + ((-3 * (self.masscart * self.r_mp**2 + self.masspole * self.r_mp**2 + self.Jm * self.Kg**2) * self.Bp) / (self.masspole * self.length**2 * (d + 3 * self.r_mp**2 * self.masspole * sintheta**2))) * theta_dot + ((-3 * self.masspole * self.r_mp**2 * sintheta * costheta) / (d + 3 * self.r_mp**2 * self.masspole * sintheta**2)) * theta_dot**2 + ((3 * (self.masscart * self.r_mp**2 + self.masspole * self.r_mp**2 + self.Jm * self.Kg**2) * self.gravity * sintheta) / (self.length * (d + 3 * self.r_mp**2 * self.masspole * sintheta**2))) + (3 * self.r_mp * self.Kg * self.Kt * costheta) / (self.length * self.Rm * (d + 3 * self.r_mp**2 * self.masspole * sintheta**2)) * force
+        # self.state = (x, x_dot, theta, theta_dot), written into the preallocated state buffer
+        state = self._state
+        state[0] = x
+        state[1] = x_dot
+        state[2] = theta
+        state[3] = theta_dot
+        return state
 
-        if self.kinematics_integrator == "euler":
-            x = x + self.tau * x_dot
-            x_dot = x_dot + self.tau * xacc
-            theta = theta + self.tau * theta_dot
-            theta_dot = theta_dot + self.tau * thetaacc
-
-        if self.kinematics_integrator == "semi-euler":
-            x_dot = x_dot + self.tau * xacc
-            x = x + self.tau * x_dot
-            theta_dot = theta_dot + self.tau * thetaacc
-            theta = theta + self.tau * theta_dot
-
-        if self.kinematics_integrator == "RK4":
-            # RK4
-            y = self.state
-            k1 = self.RHS(y, force = force)
-            k2 = self.RHS(y + self.tau * k1 / 2, force = force)
-            k3 = self.RHS(y + self.tau * k2 / 2, force = force)
-            k4 = self.RHS(y + self.tau * k3, force = force)
-            y = y + self.tau/6 * (k1 + 2 * k2 + 2 * k3 + k4)
-            x, x_dot, theta, theta_dot = y
-
-        # self.state = (x, x_dot, theta, theta_dot)
-        return np.array( (x, x_dot,theta, theta_dot), dtype = np.float32).flatten()
+    # stepPhysics was a byte-for-byte copy of stepSwingUp; kept as an alias
+    stepPhysics = stepSwingUp
 
     def reward(self, terminated, off_track):
 
         x, x_dot, theta, theta_dot = self.state
-        cos = np.cos(theta)
-        sin = np.sin(theta)
 
         # theta = np.arctan2(sin, cos) nikki_: this coordinate is different
         #theta = np.arctan2(cos, -sin) - math.pi / 2
-        theta = np.arctan2(sin, cos)
+        # wrap to [-pi, pi): same as atan2(sin(theta), cos(theta)) without the three transcendentals
+        theta = (theta + math.pi) % (2 * math.pi) - math.pi
 
         #if abs(theta) < 0.1:
         #    print(theta)
@@ -313,10 +442,24 @@ class CartPoleSwingUp(gym.Env[np.ndarray, Union[int, np.ndarray]]):
         return reward
         #(GEARS (?))
 
+    def _fill_obs(self, x, x_dot, theta, theta_dot):
+        # one float32 allocation, filled in place (no tuple -> array -> flatten copies).
+        # Not a shared buffer: SB3 keeps the last observation as "terminal_observation" across reset().
+        obs = np.empty(5, dtype=np.float32)
+        obs[0] = x
+        obs[1] = x_dot
+        obs[2] = math.cos(theta)
+        obs[3] = math.sin(theta)
+        obs[4] = theta_dot
+        return obs
+
     def step(self, action):
         # !!this block may contain bugs!!
-        # Cast action to float to strip np trappings
-        force = self.force_mag * float(action)
+        # Take the single action value as a Python float (SB3 passes a shape-(1,) array, which
+        # float() no longer accepts in NumPy 2), and bound it to the action space with scalar
+        # min/max (np.clip on a single value costs microseconds of array dispatch)
+        a = np.asarray(action).item()
+        force = self.force_mag * max(-self.max_action, min(self.max_action, a))
         # force = float(np.clip( self.max_action * action, -self.max_action, self.max_action))
 
         # Nikki modified the following force from continuous_mountain_car
@@ -338,7 +481,7 @@ class CartPoleSwingUp(gym.Env[np.ndarray, Union[int, np.ndarray]]):
         # Matlab Train DDPG to swing up and balance pole
         #
 
-        obs = np.array( (x, x_dot, np.cos(theta), np.sin(theta), theta_dot), dtype=np.float32).flatten()
+        obs = self._fill_obs(x, x_dot, theta, theta_dot)
 
         """
         #NX changed from above to below
@@ -372,18 +515,14 @@ class CartPoleSwingUp(gym.Env[np.ndarray, Union[int, np.ndarray]]):
         # self.state = np.array(
         #   self.np_random.uniform(low=low, high=high, size=(4,))
         #   - [0,0,math.pi,0] ).flatten()
-        self.state = np.array(
-                [ self.np_random.uniform(low = -0.05, high = 0.05),
-                  0 ,
-                  self.np_random.uniform(low = -0.001, high = 0.001) - math.pi,
-                  0 ]
-                ).flatten()
+        self._state[:] = self.np_random.uniform(_RESET_LOW, _RESET_HIGH)
+        self.state = self._state
         self.steps_beyond_terminated = None
 
         x, x_dot, theta, theta_dot = self.state
         # changed obs to be consistent as before in step
 
-        obs = np.array( (x, x_dot, np.cos(theta), np.sin(theta), theta_dot), dtype=np.float32).flatten()
+        obs = self._fill_obs(x, x_dot, theta, theta_dot)
         #obs = np.array((np.sin(theta), np.cos(theta), theta_dot, x, x_dot),
         #              dtype=np.float32).flatten()
         # to go from observation (obs) angles to state space angle, need the following transformation (rotate the coordinate by pi/2):
@@ -391,7 +530,7 @@ class CartPoleSwingUp(gym.Env[np.ndarray, Union[int, np.ndarray]]):
 
         if self.render_mode == "human":
             self.render()
-        return np.array(obs, dtype=np.float32), {}
+        return obs, {}
 
 
 
@@ -425,76 +564,61 @@ class CartPoleSwingUp(gym.Env[np.ndarray, Union[int, np.ndarray]]):
                 )
             else:  # mode == "rgb_array"
                 self.screen = pygame.Surface((self.screen_width, self.screen_height))
+            self._blank = pygame.Surface((self.screen_width, self.screen_height))
+            self._blank.fill((255, 255, 255))
+            gfxdraw.hline(self._blank, 0, self.screen_width, self._carty, (0, 0, 0))
+            self._drawn_state = None
         if self.clock is None:
             self.clock = pygame.time.Clock()
 
-        world_width = self.x_threshold * 2
-        scale = self.screen_width / world_width
-        polewidth = 10.0
-        polelen = scale * (2 * self.length)
-        cartwidth = 50.0
-        cartheight = 30.0
-
         if self.state is None:
             return None
 
         x = self.state
 
-        self.surf = pygame.Surface((self.screen_width, self.screen_height))
-        self.surf.fill((255, 255, 255))
-
-        l, r, t, b = -cartwidth / 2, cartwidth / 2, cartheight / 2, -cartheight / 2
-        axleoffset = cartheight / 4.0
-        cartx = x[0] * scale + self.screen_width / 2.0  # MIDDLE OF CART
-        carty = 100  # TOP OF CART
-        cart_coords = [(l, b), (l, t), (r, t), (r, b)]
-        cart_coords = [(c[0] + cartx, c[1] + carty) for c in cart_coords]
-        gfxdraw.aapolygon(self.surf, cart_coords, (0, 0, 0))
-        gfxdraw.filled_polygon(self.surf, cart_coords, (0, 0, 0))
-
-        l, r, t, b = (
-            -polewidth / 2,
-            polewidth / 2,
-            polelen - polewidth / 2,
-            -polewidth / 2,
-        )
-
-        pole_coords = []
-        for coord in [(l, b), (l, t), (r, t), (r, b)]:
-            coord = pygame.math.Vector2(coord).rotate_rad(-x[2])
-            coord = (coord[0] + cartx, coord[1] + carty + axleoffset)
-            pole_coords.append(coord)
-        gfxdraw.aapolygon(self.surf, pole_coords, (202, 152, 101))
-        gfxdraw.filled_polygon(self.surf, pole_coords, (202, 152, 101))
-
-        gfxdraw.aacircle(
-            self.surf,
-            int(cartx),
-            int(carty + axleoffset),
-            int(polewidth / 2),
-            (129, 132, 203),
-        )
-        gfxdraw.filled_circle(
-            self.surf,
-            int(cartx),
-            int(carty + axleoffset),
-            int(polewidth / 2),
-            (129, 132, 203),
-        )
-
-        gfxdraw.hline(self.surf, 0, self.screen_width, carty, (0, 0, 0))
-
-        self.surf = pygame.transform.flip(self.surf, False, True)
-        self.screen.blit(self.surf, (0, 0))
+        # only redraw when the state moved since the last frame (e.g. rgb_array polled twice)
+        if tuple(x) != self._drawn_state:
+            self._drawn_state = tuple(x)
+            self.screen.blit(self._blank, (0, 0))
+
+            # Python floats: pygame.draw rejects np.float32 coordinates from the float32 state buffer
+            cartx = float(x[0]) * self._scale + self.screen_width / 2.0  # MIDDLE OF CART
+            cart_rect = pygame.Rect((cartx - self._cart_halfwidth, self._cart_top), self._cart_size)
+            pygame.draw.rect(self.screen, (0, 0, 0), cart_rect)
+
+            # rotate the corners by -theta (what Vector2.rotate_rad did) with one cos/sin pair
+            theta = float(x[2])
+            c, s = math.cos(-theta), math.sin(-theta)
+            pole_coords = [
+                (lx * c - ly * s + cartx, self._axley - (lx * s + ly * c))
+                for lx, ly in self._pole_local
+            ]
+            pygame.draw.polygon(self.screen, (202, 152, 101), pole_coords)
+
+            if self.render_mode != "rgb_array":  # frames for a network do not need the anti-aliased edge
+                gfxdraw.aacircle(
+                    self.screen,
+                    int(cartx),
+                    self._axle_row,
+                    self._axle_radius,
+                    (129, 132, 203),
+                )
+            gfxdraw.filled_circle(
+                self.screen,
+                int(cartx),
+                self._axle_row,
+                self._axle_radius,
+                (129, 132, 203),
+            )
         if self.render_mode == "human":
             pygame.event.pump()
             self.clock.tick(self.metadata["render_fps"])
             pygame.display.flip()
 
         elif self.render_mode == "rgb_array":
-            return np.transpose(
-                np.array(pygame.surfarray.pixels3d(self.screen)), axes=(1, 0, 2)
-            )
+            # one copy, straight into a C-contiguous (H, W, 3) frame; the pixels3d view itself
+            # is not returned because it aliases the screen, which the next frame redraws
+            return pygame.surfarray.pixels3d(self.screen).transpose(1, 0, 2).copy()
 
     def close(self):
         if self.screen is not None:
@@ -506,4 +630,360 @@ class CartPoleSwingUp(gym.Env[np.ndarray, Union[int, np.ndarray]]):
 
 
 
-# below is copied without modification from native cartpole
\ No newline at end of file
+class VectorCartPoleSwingUp(VectorEnv):
+
+    """
+    Vectorized version of CartPoleSwingUp, adapted from the native CartPoleVectorEnv.
+
+    All num_envs cart-poles are advanced together with NumPy array operations instead of
+    looping over one Python env per sub-environment. The state is stored as a (4, num_envs)
+    array (x, x_dot, theta, theta_dot), and the dynamics, reward and termination are the same
+    as in CartPoleSwingUp.
+
+    Sub-environments that finish are reset on the following call to step (like the native
+    vector envs), which then returns their initial observation with a reward of 0.
+
+    In "human" mode only every render_every-th step is drawn, and the frame rate is lowered to
+    match, so the animation still plays in real time.
+
+    Only the sub-environments in render_indices are drawn. By default that is env 0 in "human"
+    mode (the only one shown in the window) and all of them in "rgb_array" mode, where render
+    returns one frame per index.
+
+    With backend="cupy" the state, step and reset run on the GPU, and the observations, rewards
+    and flags are returned as CuPy arrays (call .get() on them for NumPy); this only pays off for
+    very large num_envs.
+    """
+
+    metadata = {
+        "render_modes": ["human", "rgb_array"],
+        "render_fps": 100,
+        "autoreset_mode": AutoresetMode.NEXT_STEP,
+    }
+
+    def __init__(
+        self,
+        num_envs: int = 1,
+        max_episode_steps: Optional[int] = None,
+        render_mode: Optional[str] = None,
+        render_every: int = 1,
+        backend: str = "numpy",
+        render_indices: Optional[Sequence[int]] = None,
+    ):
+        if backend == "numpy":
+            xp = np
+        elif backend == "cupy":
+            try:
+                import cupy as xp
+            except ImportError as e:
+                raise DependencyNotInstalled(
+                    "cupy is not installed, run `pip install cupy-cuda12x` (matching your CUDA version)"
+                ) from e
+        else:
+            raise ValueError(f'backend must be "numpy" or "cupy", got {backend!r}')
+        if render_every < 1:
+            raise ValueError(f"render_every must be at least 1, got {render_every!r}")
+        self.backend = backend
+        self.xp = xp
+        # a single fused CUDA kernel for the RK4 step on the GPU
+        self._rk4_fused = _fused_rk4(xp) if backend == "cupy" else None
+
+        self.num_envs = num_envs
+        self.max_episode_steps = max_episode_steps
+
+        # same physical constants as CartPoleSwingUp
+        self.gravity = 9.81
+        self.masscart = 0.57+0.37
+        self.masspole = 0.230
+        self.length = 0.3302  # actually half the pole's length
+        self.r_mp = 6.35e-3 # motor pinion radius
+        self.Jm = 3.90e-7 # rotor moment of inertia
+        self.Kg = 3.71 # planetary gearbox gear ratio
+        self.Rm = 2.6 # motor armature resistance
+        self.Kt = 0.00767 # motor torque constant
+        self.Km = 0.00767 # Back-ElectroMotive-Force (EMF) Constant V.s/RAD
+        self.Beq = 5.4 #  equivalent viscous damping coecient as seen at the motor pinion
+        self.Bp = 0.0024 # viscous damping doecient, as seen at the pendulum axis
+        # everything the step touches is float32, so the (4, num_envs) state moves half the bytes
+        self._coeffs = tuple(np.float32(c) for c in _swingup_coeffs(self))
+
+        self.force_mag = 10.0
+        self.tau = 1/100  # seconds between state updates
+        self._tau = np.float32(self.tau)
+
+        self.x_threshold = 0.25
+
+        self.steps = xp.zeros(num_envs, dtype=np.int32)
+        self.prev_done = xp.zeros(num_envs, dtype=np.bool_)
+        self.previous_force = xp.zeros(num_envs, dtype=np.float32)
+        # scratch for redrawing the initial state of finished environments without a temporary per step
+        self._reset_scratch = xp.empty((4, num_envs), dtype=np.float32)
+        self._reset_low = xp.asarray(_RESET_LOW[:, None], dtype=np.float32)
+        self._reset_span = xp.asarray(_RESET_SPAN[:, None], dtype=np.float32)
+        self._rng = None  # random generator of the backend, seeded from np_random in reset
+        # persistent SoA state (one row per variable) and the derivative buffer of the array RK4 path
+        self._state = xp.empty((4, num_envs), dtype=np.float32)
+        self._k = xp.empty((4, num_envs), dtype=np.float32)
+        self._sin = xp.empty(num_envs, dtype=np.float32)
+        self._cos = xp.empty(num_envs, dtype=np.float32)
+
+        high = np.full(5, np.finfo(np.float32).max, dtype=np.float32)
+        self.max_action = 1.0
+
+        self.single_action_space = spaces.Box(
+                low=-self.max_action, high=self.max_action, shape=(1,), dtype=np.float32
+                )
+        self.action_space = batch_space(self.single_action_space, num_envs)
+        self.single_observation_space = spaces.Box(-high, high, dtype=np.float32)
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+
+        self.render_mode = render_mode
+        self.render_every = render_every
+        self.render_step = 0
+        if render_indices is None:
+            render_indices = [0] if render_mode == "human" else range(num_envs)
+        self.render_indices = np.asarray(render_indices, dtype=np.intp)
+
+        self.screen_width = 600
+        self.screen_height = 400
+        # render geometry, fixed by the constants above
+        self._scale = self.screen_width / (self.x_threshold * 2)
+        self._polewidth = 10.0
+        self._polelen = self._scale * (2 * self.length)
+        cartwidth = 50.0
+        cartheight = 30.0
+        # y in screen coordinates (row 0 at the top), mirrored the way pygame.transform.flip used to
+        # mirror the finished frame, so that frames are drawn straight onto the screen
+        self._carty = self.screen_height - 1 - 100  # TOP OF CART
+        self._axley = self._carty - cartheight / 4.0
+        # integer centre row and radius of the axle circle (the row the flipped frame used to have)
+        self._axle_row = self.screen_height - 1 - int(100 + cartheight / 4.0)
+        self._axle_radius = int(self._polewidth / 2)
+        # the cart is axis aligned: a cartwidth x cartheight rect centred on (cartx, carty)
+        self._cart_halfwidth = cartwidth / 2
+        self._cart_top = self._carty - cartheight / 2
+        self._cart_size = (cartwidth, cartheight)
+        l, r, t, b = (
+            -self._polewidth / 2,
+            self._polewidth / 2,
+            self._polelen - self._polewidth / 2,
+            -self._polewidth / 2,
+        )
+        self._pole_local = np.array(((l, b), (l, t), (r, t), (r, b)))  # (4, 2), rotated for all envs at once
+        self.screens = None
+        self.window = None
+        self.clock = None
+        self._blank = None  # white background with the ground line, blitted over the screen each frame
+        self._drawn = None  # (4, len(render_indices)) state of the frames on self.screens, to skip redrawing them
+        self.state = None
+
+    def _sample_init(self, out):
+        # same initial state distribution as CartPoleSwingUp.reset: pole hanging down, cart near the centre;
+        # fills a (4, n) array in place (low + span * U[0, 1) is exactly what uniform() computes)
+        self._rng.random(dtype=out.dtype, out=out)
+        out *= self._reset_span
+        out += self._reset_low
+        return out
+
+    def _rhs_vec(self, state, force, out):
+        # time derivative of a (4, num_envs) state, written row by row into out (must not be state)
+        xp = self.xp
+        xp.sin(state[2], out=self._sin)
+        xp.cos(state[2], out=self._cos)
+        out[0] = state[1]
+        out[2] = state[3]
+        out[1], out[3] = _swingup_accel(state[1], self._sin, self._cos, state[3], force, self._coeffs)
+        return out
+
+    def _rk4_vec(self, force):
+        # the "RK4" step of CartPoleSwingUp (see _rk4) for all environments: one derivative,
+        # evaluated at the current state into the preallocated (4, num_envs) work buffer
+        k = self._rhs_vec(self.state, force, self._k)
+        k *= self._tau
+        self.state += k
+
+    def _obs(self):
+        # write straight into a float32 array instead of stacking in float64 and casting afterwards
+        xp = self.xp
+        x, x_dot, theta, theta_dot = self.state
+        obs = xp.empty((self.num_envs, 5), dtype=np.float32)
+        obs[:, 0] = x
+        obs[:, 1] = x_dot
+        obs[:, 2] = xp.cos(theta)
+        obs[:, 3] = xp.sin(theta)
+        obs[:, 4] = theta_dot
+        return obs
+
+    def step(self, action):
+        xp = self.xp
+        action = xp.asarray(action, dtype=np.float32).reshape(self.num_envs)
+        force = self.force_mag * xp.clip(action, -self.max_action, self.max_action)
+
+        # the "RK4" step of CartPoleSwingUp on all environments at once
+        if self._rk4_fused is not None:
+            self.state[0], self.state[1], self.state[2], self.state[3] = self._rk4_fused(
+                *self.state, force, self._tau, *self._coeffs)
+        elif HAVE_NUMBA:
+            _rk4_batch(self.state, force, self._coeffs, self._tau)
+        else:
+            self._rk4_vec(force)
+
+        x, x_dot, theta, theta_dot = self.state
+        off_track = xp.abs(x) > self.x_threshold
+
+        # same reward as CartPoleSwingUp.reward, which uses the force of the previous step
+        pi = np.float32(math.pi)
+        theta = xp.remainder(theta + pi, 2 * pi) - pi
+        B = xp.abs(x) > 0.23
+        # a float32 penalty keeps the bool masks from promoting the reward to float64
+        penalty = np.float32(100)
+        reward = -0.1 * (5 * theta**2 + x**2 + 0.5 * self.previous_force**2) - penalty * B - penalty * off_track
+        self.previous_force = force
+
+        self.steps += 1
+        terminated = xp.zeros(self.num_envs, dtype=np.bool_)
+        truncated = off_track
+        if self.max_episode_steps is not None:
+            truncated = truncated | (self.steps >= self.max_episode_steps)
+
+        # Reset all environments which were truncated in the last step
+        if self.prev_done.any():
+            xp.copyto(self.state, self._sample_init(self._reset_scratch), where=self.prev_done)
+            xp.copyto(self.previous_force, 0.0, where=self.prev_done)
+            xp.copyto(self.steps, 0, where=self.prev_done)
+            xp.copyto(reward, 0.0, where=self.prev_done)
+            xp.copyto(truncated, False, where=self.prev_done)
+        self.prev_done = truncated
+
+        self.render_step += 1
+        if self.render_mode == "human" and self.render_step % self.render_every == 0:
+            self.render()
+        return self._obs(), reward, terminated, truncated, {}
+
+    def reset(
+        self,
+        *,
+        seed: Optional[int] = None,
+        options: Optional[dict] = None,
+    ):
+        super().reset(seed=seed)
+        xp = self.xp
+        if xp is np:
+            self._rng = self.np_random
+        elif self._rng is None or seed is not None:
+            # the device generator is seeded from np_random, so seeding reset stays reproducible
+            self._rng = xp.random.default_rng(int(self.np_random.integers(2**63)))
+        self.state = self._sample_init(self._state)
+        self.previous_force = xp.zeros(self.num_envs, dtype=np.float32)
+        self.steps = xp.zeros(self.num_envs, dtype=np.int32)
+        self.prev_done = xp.zeros(self.num_envs, dtype=np.bool_)
+
+        if self.render_mode == "human":
+            self.render()
+        return self._obs(), {}
+
+    def render(self):
+        if self.render_mode is None:
+            # constructed directly rather than through gym.make_vec, so there is no spec to name
+            gym.logger.warn(
+                "You are calling render method without specifying any render mode. "
+                "You can specify the render_mode at initialization, "
+                'e.g. VectorCartPoleSwingUp(render_mode="rgb_array")'
+            )
+            return
+
+        try:
+            import pygame
+            from pygame import gfxdraw
+        except ImportError as e:
+            raise DependencyNotInstalled(
+                "pygame is not installed, run `pip install gymnasium[classic-control]`"
+            ) from e
+
+        if self.screens is None:
+            pygame.init()
+            self.screens = [
+                pygame.Surface((self.screen_width, self.screen_height))
+                for _ in self.render_indices
+            ]
+            self._blank = pygame.Surface((self.screen_width, self.screen_height))
+            self._blank.fill((255, 255, 255))
+            gfxdraw.hline(self._blank, 0, self.screen_width, self._carty, (0, 0, 0))
+            self._drawn = None
+            if self.render_mode == "human":
+                # only the first rendered environment is shown on screen
+                pygame.display.init()
+                self.window = pygame.display.set_mode(
+                    (self.screen_width, self.screen_height)
+                )
+        if self.clock is None:
+            self.clock = pygame.time.Clock()
+
+        if self.state is None:
+            return None
+
+        # columns of the rendered environments (a copy), in host memory for pygame
+        state = self.state[:, self.render_indices]
+        if self.xp is not np:
+            state = self.xp.asnumpy(state)
+        # only redraw the environments whose state moved since the last frame
+        if self._drawn is None:
+            moved = np.ones(len(self.render_indices), dtype=np.bool_)
+        else:
+            moved = (state != self._drawn).any(axis=0)
+        self._drawn = state
+
+        # cart centres and rotated pole corners of all environments at once: the corners are
+        # rotated by -theta (what Vector2.rotate_rad did one corner at a time) and moved to the axle
+        cartxs = state[0].astype(np.float64) * self._scale + self.screen_width / 2.0  # MIDDLE OF CART
+        c = np.cos(-state[2].astype(np.float64))[:, None]
+        s = np.sin(-state[2].astype(np.float64))[:, None]
+        lx, ly = self._pole_local.T
+        poles = np.empty((len(self.render_indices), 4, 2))
+        poles[:, :, 0] = lx * c - ly * s + cartxs[:, None]
+        poles[:, :, 1] = self._axley - (lx * s + ly * c)
+
+        for cartx, pole_coords, screen, dirty in zip(cartxs.tolist(), poles.tolist(), self.screens, moved):
+            if not dirty:
+                continue
+            screen.blit(self._blank, (0, 0))
+
+            cart_rect = pygame.Rect((cartx - self._cart_halfwidth, self._cart_top), self._cart_size)
+            pygame.draw.rect(screen, (0, 0, 0), cart_rect)
+
+            pygame.draw.polygon(screen, (202, 152, 101), pole_coords)
+
+            if self.render_mode != "rgb_array":  # frames for a network do not need the anti-aliased edge
+                gfxdraw.aacircle(
+                    screen,
+                    int(cartx),
+                    self._axle_row,
+                    self._axle_radius,
+                    (129, 132, 203),
+                )
+            gfxdraw.filled_circle(
+                screen,
+                int(cartx),
+                self._axle_row,
+                self._axle_radius,
+                (129, 132, 203),
+            )
+
+        if self.render_mode == "human":
+            self.window.blit(self.screens[0], (0, 0))
+            pygame.event.pump()
+            self.clock.tick(self.metadata["render_fps"] / self.render_every)
+            pygame.display.flip()
+
+        elif self.render_mode == "rgb_array":
+            # one C-contiguous (H, W, 3) copy per screen, as in CartPoleSwingUp.render
+            return [
+                pygame.surfarray.pixels3d(screen).transpose(1, 0, 2).copy()
+                for screen in self.screens
+            ]
+
+    def close(self, **kwargs):
+        if self.screens is not None:
+            import pygame
+
+            pygame.quit()
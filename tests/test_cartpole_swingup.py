@@ -0,0 +1,132 @@
+import math
+import os
+
+# headless pygame, so "human" mode can open its window without a display
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pygame")
+
+from myCartpoleF_SwingUp import CartPoleSwingUp, VectorCartPoleSwingUp
+
+
+@pytest.mark.parametrize("render_mode", ["human", "rgb_array"])
+def test_scalar_env_reset_step_render(render_mode):
+    env = CartPoleSwingUp(render_mode=render_mode)
+    env.reset(seed=0)
+    env.step(np.array([0.5], dtype=np.float32))
+    frame = env.render()
+    if render_mode == "rgb_array":
+        assert frame.shape == (env.screen_height, env.screen_width, 3)
+        assert frame.dtype == np.uint8
+    else:
+        assert frame is None
+    env.close()
+
+
+@pytest.mark.parametrize("render_mode", ["human", "rgb_array"])
+def test_vector_env_reset_step_render(render_mode):
+    env = VectorCartPoleSwingUp(num_envs=3, render_mode=render_mode)
+    env.reset(seed=0)
+    env.step(np.full((3, 1), 0.5, dtype=np.float32))
+    frames = env.render()
+    if render_mode == "rgb_array":
+        assert len(frames) == 3
+        assert all(frame.shape == (env.screen_height, env.screen_width, 3) for frame in frames)
+    else:
+        assert frames is None
+    env.close()
+
+
+def _cart_pixel(frame, env, x):
+    # the cart is a black 50 px wide rect centred on the cart position, 100 px above the bottom
+    # edge; look 15 px right of centre, clear of the 10 px wide pole hanging through the middle
+    col = int(env.screen_width / 2 + x * env.screen_width / (2 * env.x_threshold)) + 15
+    row = env.screen_height - 1 - 100
+    return tuple(frame[row, col])
+
+
+def test_cart_rect_is_drawn_at_the_cart_position():
+    env = CartPoleSwingUp(render_mode="rgb_array")
+    env.reset(seed=1)
+    frame = env.render()
+    assert _cart_pixel(frame, env, float(env.state[0])) == (0, 0, 0)
+    env.close()
+
+    venv = VectorCartPoleSwingUp(num_envs=2, render_mode="rgb_array")
+    venv.reset(seed=1)
+    for frame, x in zip(venv.render(), venv.state[0]):
+        assert _cart_pixel(frame, venv, float(x)) == (0, 0, 0)
+    venv.close()
+
+
+def test_rk4_setting_keeps_the_trained_euler_equivalent_step():
+    # the checkpoint in model/ was trained with an "RK4" whose stages all saw the current state,
+    # which is an explicit Euler step; the dynamics must not drift away from that
+    rk4 = CartPoleSwingUp()
+    euler = CartPoleSwingUp()
+    euler._integrate = euler._euler_step
+    rk4.reset(seed=2)
+    euler.reset(seed=2)
+    for a in np.linspace(-1, 1, 200, dtype=np.float32):
+        obs_rk4, reward_rk4, *_ = rk4.step(np.array([a]))
+        obs_euler, reward_euler, *_ = euler.step(np.array([a]))
+        np.testing.assert_allclose(obs_rk4, obs_euler, rtol=1e-6, atol=1e-6)
+        np.testing.assert_allclose(reward_rk4, reward_euler, rtol=1e-6, atol=1e-6)
+
+
+def _baseline_rk4(env, force):
+    # the "RK4" branch of the original stepSwingUp, with its formulas verbatim: RHS(y, force)
+    # read self.state instead of y, so all four stages are the derivative at the current state
+    x, x_dot, theta, theta_dot = env.state
+    costheta = math.cos(theta)
+    sintheta = math.sin(theta)
+    d = 4 * env.masscart * env.r_mp**2 + env.masspole * env.r_mp**2 + 4 * env.Jm * env.Kg**2
+    xacc = ((-4 * (env.Rm * env.r_mp**2 * env.Beq + env.Kg**2 * env.Kt * env.Km)) / (env.Rm *(d + 3 * env.r_mp**2 * env.masspole * sintheta**2))) * x_dot + ((-3 * env.Bp * env.r_mp**2 * costheta) / (env.length * (d + 3 * env.r_mp**2 * env.masspole * sintheta**2))) * theta_dot + ((-4 * env.masspole * env.length * env.r_mp**2 * sintheta) / (d + 3 * env.r_mp**2 * env.masspole * sintheta**2)) * theta_dot**2 + ((3 * env.masspole * env.gravity * env.r_mp**2 * costheta * sintheta) / (d + 3 * env.r_mp**2 * env.masspole * sintheta**2)) + (4 * env.r_mp * env.Kg * env.Kt) / (env.Rm * (d + 3 * env.r_mp**2 * env.masspole * sintheta**2)) * force
+    thetaacc = ((-3 * (env.Rm * env.r_mp**2 * env.Beq + env.Kg**2 * env.Kt * env.Km) * costheta) / (env.length * env.Rm * (d + 3 * env.r_mp**2 * env.masspole * sintheta**2))) * x_dot + ((-3 * (env.masscart * env.r_mp**2 + env.masspole * env.r_mp**2 + env.Jm * env.Kg**2) * env.Bp) / (env.masspole * env.length**2 * (d + 3 * env.r_mp**2 * env.masspole * sintheta**2))) * theta_dot + ((-3 * env.masspole * env.r_mp**2 * sintheta * costheta) / (d + 3 * env.r_mp**2 * env.masspole * sintheta**2)) * theta_dot**2 + ((3 * (env.masscart * env.r_mp**2 + env.masspole * env.r_mp**2 + env.Jm * env.Kg**2) * env.gravity * sintheta) / (env.length * (d + 3 * env.r_mp**2 * env.masspole * sintheta**2))) + (3 * env.r_mp * env.Kg * env.Kt * costheta) / (env.length * env.Rm * (d + 3 * env.r_mp**2 * env.masspole * sintheta**2)) * force
+    k = np.array((x_dot, xacc, theta_dot, thetaacc), dtype=np.float32)
+    y = env.state + env.tau / 6 * (k + 2 * k + 2 * k + k)
+    return np.array(y, dtype=np.float32)
+
+
+def test_rk4_step_matches_the_baseline_formulas():
+    env = CartPoleSwingUp()
+    env.reset(seed=2)
+    for a in np.linspace(-1, 1, 200, dtype=np.float32):
+        expected = _baseline_rk4(env, env.force_mag * float(a))
+        env.step(np.array([a]))
+        np.testing.assert_allclose(env.state, expected, rtol=1e-6, atol=1e-6)
+
+
+def test_vector_env_follows_the_scalar_env_dynamics():
+    # every sub-environment must step like CartPoleSwingUp (same "RK4", reward and observation);
+    # both envs draw different initial states, so the vector env starts from the scalar one
+    env = CartPoleSwingUp()
+    env.reset(seed=3)
+    venv = VectorCartPoleSwingUp(num_envs=2)
+    venv.reset(seed=3)
+    venv.state[:] = env.state[:, None]
+    rng = np.random.default_rng(0)
+    for _ in range(250):
+        a = np.float32(rng.uniform(-1, 1))
+        obs, reward, _, off_track, _ = env.step(np.array([a]))
+        vobs, vreward, _, vtruncated, _ = venv.step(np.full((2, 1), a, dtype=np.float32))
+        np.testing.assert_allclose(vobs, np.broadcast_to(obs, vobs.shape), rtol=1e-5, atol=1e-5)
+        np.testing.assert_allclose(vreward, reward, rtol=1e-5)
+        assert list(vtruncated) == [off_track] * 2
+
+
+def test_vector_env_render_without_render_mode_warns():
+    venv = VectorCartPoleSwingUp(num_envs=2)
+    venv.reset(seed=0)
+    with pytest.warns(UserWarning, match="without specifying any render mode"):
+        assert venv.render() is None
+    venv.close()
+
+
+@pytest.mark.parametrize("render_every", [0, -1])
+def test_vector_env_rejects_render_every_below_one(render_every):
+    with pytest.raises(ValueError, match="render_every"):
+        VectorCartPoleSwingUp(num_envs=2, render_mode="human", render_every=render_every)